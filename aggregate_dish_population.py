@@ -1,36 +1,41 @@
 import pandas as pd
-import geopandas as gpd
-import h3
+import pyarrow.parquet as pq
 
-# Step 1: Load coverage data (hex9s with signal)
-coverage_gdf = gpd.read_parquet(r"parquet_files/OH_US_hexes.parquet")
+import pipeline_metrics
+from coverage_estimation import coverage_summary, estimate_coverage, find_count_column
+from hex_table_cache import read_hex_table
 
-# Step 2: Add parent hex8 ID
-coverage_gdf["h3"] = coverage_gdf["h3_res9_id"].apply(lambda h: h3.cell_to_parent(h, 8))
+FILL_RINGS = 1
 
-# Step 3: Group by hex8 and average the signal
-hex8_signal = (
-    coverage_gdf
-    .groupby("h3")["minsignal"]
-    .mean()
-    .reset_index()
-    .rename(columns={"minsignal": "avg_minsignal"})
-)
+# Step 1: Load coverage data (hex9s with signal); only the id, signal and
+# optional sample count columns are needed, so skip the geometry decode
+coverage_file = r"parquet_files/OH_US_hexes.parquet"
+count_column = find_count_column(pq.read_schema(coverage_file).names)
+coverage_columns = ["h3_res9_id", "minsignal"] + ([count_column] if count_column else [])
+coverage_gdf = pipeline_metrics.read_parquet(coverage_file, geo=False, columns=coverage_columns)
 
-# Step 4: Load population data (must already be by hex8)
-pop_df = gpd.read_parquet(r"parquet_files/us_hexes_with_geonames.parquet")  # or gpd.read_file(...) if it's spatial
+# Step 2: Load population data (must already be by hex8). Read every column:
+# geometry/centroid/lat/lon are written back out with the signal below
+pop_df = read_hex_table(r"parquet_files/us_hexes_with_geonames.parquet")
 
 # Ensure correct H3 ID column names
 # Should contain: ["h3_res8_id", "population", "density"]
 
-# Step 5: Merge population and signal info
-merged = pop_df.merge(hex8_signal, on="h3", how="inner")
-
-# Step 6: Save all merged hexes to parquet file
-# Step 6: Filter for high-density + bad signal
+# Step 3: Hex8 signal merged onto population, weighted by the drop's sample
+# count column if it has one; hexes without res-9 samples are estimated from
+# covered neighbors within FILL_RINGS rings
+if count_column is None:
+    print("⚠️ No per-row sample count column; each res-9 hex weighs 1")
+merged = estimate_coverage(pop_df, coverage_gdf, k=FILL_RINGS, signal_name="avg_minsignal",
+                           count_column=count_column)
+summary = coverage_summary(merged)
+
+# Step 4: Save all merged hexes to parquet file
+# Step 5: Filter for high-density + bad signal
 # target_areas = merged[
 #     (merged["avg_minsignal"] <= -100)
 # ]
 merged.to_parquet("all_OH_hexes_with_signal.parquet")
 
 print(f"📊 Total population in all areas: {merged['population'].sum()}")
+print(f"   Measured: {summary['measured_population']:,.0f}, estimated from neighbors: {summary['estimated_population']:,.0f}")
@@ -1,9 +1,12 @@
-import geopandas as gpd
 import h3
 import numpy as np
 import pandas as pd
 from pathlib import Path
 
+import pipeline_metrics
+from hex_table_cache import read_hex_table
+from pipeline_metrics import instrumented
+
 def get_hexes_in_radius(center_lat, center_lon, radius_km, resolution=8):
     """Get all hexes within a given radius using apothem height"""
     # Get center hexagon
@@ -21,9 +24,10 @@ def get_hexes_in_radius(center_lat, center_lon, radius_km, resolution=8):
 def load_hex_data():
     """Load the hex data from parquet file"""
     columns = ['h3', 'population', 'geometry', 'centroid', 'lat', 'lon', 'density_per_mi2']
-    gdf = gpd.read_parquet(r"parquet_files\ng_hexes_with_coordinates.parquet", columns=columns)
+    gdf = read_hex_table(r"parquet_files\ng_hexes_with_coordinates.parquet", columns=columns)
     return gdf
 
+@instrumented("radius_population")
 def find_hexes_and_population_for_coordinate(center_lat, center_lon, radius_km, hex_gdf, resolution=8):
     """Find hexes within radius and calculate population statistics for a single coordinate"""
     
@@ -82,6 +86,7 @@ def find_hexes_and_population_for_coordinate(center_lat, center_lon, radius_km,
         'max_distance_km': max_distance
     }
 
+@instrumented("process_coordinate_list")
 def process_coordinate_list(coordinates, radius_km, resolution=8):
     """Process a list of coordinates and find hexes within radius for each"""
     
@@ -101,6 +106,7 @@ def process_coordinate_list(coordinates, radius_km, resolution=8):
     
     return results, hex_gdf
 
+@instrumented("save_results")
 def save_results(results, hex_gdf, radius_km, output_dir):
     """Save results to files"""
     
@@ -188,4 +194,4 @@ def main():
     print(f"Results saved to: {output_dir}/")
 
 if __name__ == "__main__":
-    main()
+    pipeline_metrics.run_profiled(main)
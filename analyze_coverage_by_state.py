@@ -1,44 +1,51 @@
-import geopandas as gpd
 import os
 import glob
 import time
-import h3
 
-def analyze_state_coverage(hex_file, pop_df):
+import pyarrow.parquet as pq
+
+import pipeline_metrics
+from coverage_estimation import coverage_summary, estimate_coverage, find_count_column
+from hex_ids import to_int_ids
+from hex_table_cache import read_hex_table
+from pipeline_metrics import stage
+
+def analyze_state_coverage(hex_file, pop_df, fill_rings=1):
     try:
-        # Load the state hex file
-        coverage_gdf = gpd.read_parquet(hex_file)
-        
-        # Get state code from filename
-        state = os.path.basename(hex_file).split('_')[0]
-        
-        # Add parent hex8 ID
-        coverage_gdf["h3"] = coverage_gdf["h3_res9_id"].apply(lambda h: h3.cell_to_parent(h, 8))
+        with stage("analyze_state_coverage", hex_file=hex_file):
+            # Get state code from filename
+            state = os.path.basename(hex_file).split('_')[0]
         
-        # Group by hex8 and average the signal
-        hex8_signal = (
-            coverage_gdf
-            .groupby("h3")["minsignal"]
-            .mean()
-            .reset_index()
-            .rename(columns={"minsignal": "minsignal"})
-        )
+            # Load only the columns estimate_coverage uses (no geometry decode)
+            count_column = find_count_column(pq.read_schema(hex_file).names)
+            columns = ["h3_res9_id", "minsignal"] + ([count_column] if count_column else [])
+            coverage_gdf = pipeline_metrics.read_parquet(hex_file, geo=False, columns=columns)
         
-        # Merge with population data
-        merged = pop_df.merge(hex8_signal, on="h3", how="inner")
+            # Sample-weighted hex8 signal, with gaps filled from neighbors within
+            # fill_rings rings instead of being dropped by an inner merge
+            merged = estimate_coverage(pop_df, coverage_gdf, k=fill_rings, count_column=count_column)
+            summary = coverage_summary(merged)
         
-        # Calculate population in different signal ranges
-        great_coverage = merged[merged['minsignal'] >= -90]['population'].sum()
-        good_coverage = merged[(merged['minsignal'] > -100) & (merged['minsignal'] < -90)]['population'].sum()
-        poor_coverage = merged[merged['minsignal'] <= -100]['population'].sum()
-        total_population = merged['population'].sum()
+            # Calculate population in different signal ranges
+            with stage("coverage_bands", state=state) as metrics:
+                great_coverage = merged[merged['minsignal'] >= -90]['population'].sum()
+                good_coverage = merged[(merged['minsignal'] > -100) & (merged['minsignal'] < -90)]['population'].sum()
+                poor_coverage = merged[merged['minsignal'] <= -100]['population'].sum()
+                total_population = merged['population'].sum()
+                metrics.rows = len(merged)
         
-        # Print results
-        print(f"\n📊 {state} Coverage Analysis:")
-        print(f"Total Population: {total_population:,.0f}")
-        print(f"Great Coverage (≥ -90 dBm): {great_coverage:,.0f} ({great_coverage/total_population*100:.1f}%)")
-        print(f"Good Coverage (-100 < x < -90 dBm): {good_coverage:,.0f} ({good_coverage/total_population*100:.1f}%)")
-        print(f"Poor Coverage (≤ -100 dBm): {poor_coverage:,.0f} ({poor_coverage/total_population*100:.1f}%)")
+            # Print results
+            print(f"\n📊 {state} Coverage Analysis:")
+            print(f"Total Population: {total_population:,.0f}")
+            if count_column is None:
+                print("Signal weighting: none (no per-row sample count column; each res-9 hex weighs 1)")
+            else:
+                print(f"Signal weighting: by '{count_column}'")
+            print(f"Measured: {summary['measured_population']:,.0f} ({summary['measured_hexes']:,} hexes), "
+                  f"Estimated from neighbors: {summary['estimated_population']:,.0f} ({summary['estimated_hexes']:,} hexes)")
+            print(f"Great Coverage (≥ -90 dBm): {great_coverage:,.0f} ({great_coverage/total_population*100:.1f}%)")
+            print(f"Good Coverage (-100 < x < -90 dBm): {good_coverage:,.0f} ({good_coverage/total_population*100:.1f}%)")
+            print(f"Poor Coverage (≤ -100 dBm): {poor_coverage:,.0f} ({poor_coverage/total_population*100:.1f}%)")
         
     except Exception as e:
         print(f"❌ Error processing {hex_file}: {e}")
@@ -46,7 +53,8 @@ def analyze_state_coverage(hex_file, pop_df):
 def main():
     # Load population data once
     print("Loading population data...")
-    pop_df = gpd.read_parquet("parquet_files/us_hexes_with_geonames.parquet")
+    pop_df = read_hex_table("parquet_files/us_hexes_with_geonames.parquet", columns=["h3", "population"])
+    pop_df["h3_int"] = to_int_ids(pop_df["h3"])
     
     # Find all state hex files
     hex_files = glob.glob("parquet_files/*_US_hexes.parquet")
@@ -59,4 +67,4 @@ def main():
         print("-" * 50)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    pipeline_metrics.run_profiled(main) 
\ No newline at end of file
@@ -0,0 +1,282 @@
+import gzip
+import math
+import struct
+from collections import defaultdict
+from pathlib import Path
+
+import h3
+import numpy as np
+
+import pipeline_metrics
+from hex_ids import parent_ids, to_int_ids
+from pipeline_metrics import stage
+
+LAYER_NAME = "hexes"
+EXTENT = 4096
+MIN_ZOOM = 0
+MAX_ZOOM = 14
+MAX_LAT = 85.0511287798
+KM2_PER_MI2 = 2.589988110336
+
+def resolution_for_zoom(zoom, base_res=8):
+    """H3 resolution drawn at a zoom: two zooms per resolution, capped at the data resolution"""
+    return min(base_res, zoom // 2 + 1)
+
+def load_population_table(parquet_path, signal_column=None):
+    """Load only the columns needed for tiles (no geometry decode)"""
+    columns = ['h3', 'population']
+    if signal_column:
+        columns.append(signal_column)
+    return pipeline_metrics.read_parquet(parquet_path, geo=False, columns=columns)
+
+def aggregate_to_resolution(df, res, signal_column=None):
+    """Roll the base hex table up to a coarser H3 resolution
+
+    Population is summed; the signal column is averaged over the child hexes
+    that have a value, matching the plain groupby mean used elsewhere.
+    """
+    with stage("aggregate_pyramid_level", res=res) as metrics:
+        ids = parent_ids(df['h3_int'].to_numpy(), res)
+        grouped = df.assign(h3_int=ids).groupby('h3_int', sort=True)
+        agg = grouped['population'].sum().to_frame()
+        agg['hex_count'] = grouped.size()
+        if signal_column:
+            agg[signal_column] = grouped[signal_column].mean()
+        agg = agg.reset_index()
+        agg['h3'] = [h3.int_to_str(int(i)) for i in agg['h3_int']]
+        # Same unit the parquet tables and the map's density filter use
+        agg['density_per_mi2'] = agg['population'] / (h3.average_hexagon_area(res, unit='km^2') / KM2_PER_MI2)
+        metrics.rows = len(agg)
+    return agg
+
+def cell_rings(cells):
+    """Flattened (lat, lng) vertices for each cell plus the start offset of each ring"""
+    boundaries = [h3.cell_to_boundary(cell) for cell in cells]
+    counts = np.fromiter((len(b) for b in boundaries), dtype=np.int64, count=len(boundaries))
+    latlng = np.array([point for boundary in boundaries for point in boundary], dtype=np.float64)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    # Unwrap rings crossing the antimeridian (Aleutians) so they stay compact
+    span = np.maximum.reduceat(latlng[:, 1], starts) - np.minimum.reduceat(latlng[:, 1], starts)
+    wraps = np.repeat(span > 180.0, counts) & (latlng[:, 1] < 0)
+    latlng[wraps, 1] += 360.0
+    return latlng, starts, counts
+
+def project_to_tiles(latlng, zoom):
+    """Web Mercator world coordinates in tile units (x right, y down) at a zoom"""
+    scale = 2 ** zoom
+    lat = np.radians(np.clip(latlng[:, 0], -MAX_LAT, MAX_LAT))
+    x = (latlng[:, 1] + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * scale
+    return x, y
+
+# --- minimal protobuf encoding of the Mapbox Vector Tile 2.1 schema ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _key(field, wire_type):
+    return _varint((field << 3) | wire_type)
+
+def _message(field, payload):
+    return _key(field, 2) + _varint(len(payload)) + payload
+
+def _packed(field, values):
+    return _message(field, b"".join(_varint(v) for v in values))
+
+def _encode_value(value):
+    if isinstance(value, str):
+        return _message(1, value.encode("utf-8"))
+    if isinstance(value, (bool, np.bool_)):
+        return _key(7, 0) + _varint(int(value))
+    if isinstance(value, (int, np.integer)):
+        return _key(6, 0) + _varint(_zigzag(int(value)))
+    return _key(3, 1) + struct.pack("<d", float(value))
+
+def _ring_commands(xs, ys):
+    """MoveTo/LineTo/ClosePath commands for one exterior ring, or None if degenerate"""
+    points = []
+    for x, y in zip(xs, ys):
+        if not points or points[-1] != (x, y):
+            points.append((x, y))
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    if len(points) < 3:
+        return None
+    # Exterior rings must have positive area in tile coordinates (y down)
+    area = sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1]))
+    if area == 0:
+        return None
+    if area < 0:
+        points.reverse()
+
+    commands = [(1 & 0x7) | (1 << 3)]  # MoveTo, count 1
+    cx, cy = 0, 0
+    for i, (x, y) in enumerate(points):
+        if i == 1:
+            commands.append((2 & 0x7) | ((len(points) - 1) << 3))  # LineTo
+        commands.extend((_zigzag(x - cx), _zigzag(y - cy)))
+        cx, cy = x, y
+    commands.append((7 & 0x7) | (1 << 3))  # ClosePath
+    return commands
+
+def encode_tile(features, property_columns):
+    """Encode (id, commands, properties) features as a gzipped single-layer MVT"""
+    keys = {name: i for i, name in enumerate(property_columns)}
+    values = {}
+    encoded_features = []
+    for feature_id, commands, properties in features:
+        tags = []
+        for name, value in zip(property_columns, properties):
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                continue
+            tags.append(keys[name])
+            tags.append(values.setdefault((type(value).__name__, value), len(values)))
+        encoded_features.append(_message(2,
+            _key(1, 0) + _varint(feature_id)
+            + _packed(2, tags)
+            + _key(3, 0) + _varint(3)  # POLYGON
+            + _packed(4, commands)
+        ))
+
+    layer = (
+        _key(15, 0) + _varint(2)
+        + _message(1, LAYER_NAME.encode("utf-8"))
+        + b"".join(encoded_features)
+        + b"".join(_message(3, name.encode("utf-8")) for name in property_columns)
+        + b"".join(_message(4, _encode_value(value)) for _, value in values)
+        + _key(5, 0) + _varint(EXTENT)
+    )
+    return gzip.compress(_message(3, layer), mtime=0)
+
+def build_zoom_tiles(agg, rings, zoom, property_columns, tile_id):
+    """Yield (tile id, tile bytes) for every tile touched by the hexes at one zoom
+
+    Tiles come out in tile_id(zoom, x, y) order and are encoded one at a time,
+    so only the member lists, not the encoded tiles, are held for a zoom.
+    """
+    latlng, starts, counts = rings
+    wx, wy = project_to_tiles(latlng, zoom)
+    tx_min = np.floor(np.minimum.reduceat(wx, starts)).astype(np.int64)
+    tx_max = np.floor(np.maximum.reduceat(wx, starts)).astype(np.int64)
+    ty_min = np.floor(np.minimum.reduceat(wy, starts)).astype(np.int64)
+    ty_max = np.floor(np.maximum.reduceat(wy, starts)).astype(np.int64)
+    last_tile = 2 ** zoom - 1
+
+    # Hexes crossing a tile edge go into every tile they touch
+    tile_members = defaultdict(list)
+    for i in range(len(agg)):
+        for tx in range(max(tx_min[i], 0), min(tx_max[i], last_tile) + 1):
+            for ty in range(max(ty_min[i], 0), min(ty_max[i], last_tile) + 1):
+                tile_members[(tx, ty)].append(i)
+
+    ids = agg['h3_int'].to_numpy()
+    records = agg[property_columns].astype(object).where(agg[property_columns].notna(), None).values.tolist()
+    for key, (tx, ty) in sorted((tile_id(zoom, tx, ty), (tx, ty)) for tx, ty in tile_members):
+        members = tile_members.pop((tx, ty))
+        features = []
+        for i in members:
+            start, end = starts[i], starts[i] + counts[i]
+            px = np.rint((wx[start:end] - tx) * EXTENT).astype(np.int64).tolist()
+            py = np.rint((wy[start:end] - ty) * EXTENT).astype(np.int64).tolist()
+            commands = _ring_commands(px, py)
+            if commands is not None:
+                features.append((int(ids[i]), commands, records[i]))
+        if features:
+            yield key, encode_tile(features, property_columns)
+
+def build_pmtiles(parquet_path, output_path, signal_column=None, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Render the population hex table into a single PMTiles vector tile archive"""
+    try:
+        from pmtiles.tile import Compression, TileType, zxy_to_tileid
+        from pmtiles.writer import Writer
+    except ImportError as e:
+        raise ImportError("PMTiles output requires the pmtiles package (pip install pmtiles)") from e
+
+    df = load_population_table(parquet_path, signal_column)
+    df['h3_int'] = to_int_ids(df['h3'])
+    base_res = h3.get_resolution(df['h3'].iloc[0])
+
+    property_columns = ['h3', 'population', 'density_per_mi2', 'hex_count']
+    if signal_column:
+        property_columns.append(signal_column)
+
+    levels = {}
+    tile_count = 0
+    with open(output_path, 'wb') as f:
+        writer = Writer(f)
+        for zoom in range(min_zoom, max_zoom + 1):
+            res = resolution_for_zoom(zoom, base_res)
+            if res not in levels:
+                # Only one pyramid level is kept in memory at a time
+                levels.clear()
+                agg = aggregate_to_resolution(df, res, signal_column)
+                levels[res] = (agg, cell_rings(agg['h3']))
+            agg, rings = levels[res]
+
+            with stage("build_zoom_tiles", zoom=zoom, res=res) as metrics:
+                zoom_tiles = 0
+                for tile_id, data in build_zoom_tiles(agg, rings, zoom, property_columns, zxy_to_tileid):
+                    writer.write_tile(tile_id, data)
+                    zoom_tiles += 1
+                metrics.rows = zoom_tiles
+            tile_count += zoom_tiles
+            print(f"  z{zoom} (res {res}): {zoom_tiles:,} tiles")
+
+        latlng = levels[res][1][0]
+        min_lon, max_lon = float(latlng[:, 1].min()), min(float(latlng[:, 1].max()), 180.0)
+        min_lat, max_lat = float(latlng[:, 0].min()), float(latlng[:, 0].max())
+        center_lon, center_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+        writer.finalize(
+            {
+                "tile_type": TileType.MVT,
+                "tile_compression": Compression.GZIP,
+                "min_zoom": min_zoom,
+                "max_zoom": max_zoom,
+                "min_lon_e7": int(min_lon * 10_000_000),
+                "min_lat_e7": int(min_lat * 10_000_000),
+                "max_lon_e7": int(max_lon * 10_000_000),
+                "max_lat_e7": int(max_lat * 10_000_000),
+                "center_zoom": min_zoom + (max_zoom - min_zoom) // 2,
+                "center_lon_e7": int(center_lon * 10_000_000),
+                "center_lat_e7": int(center_lat * 10_000_000),
+            },
+            {
+                "name": Path(parquet_path).stem,
+                "format": "pbf",
+                "vector_layers": [{
+                    "id": LAYER_NAME,
+                    "minzoom": min_zoom,
+                    "maxzoom": max_zoom,
+                    "fields": {
+                        column: "String" if column == 'h3' else "Number"
+                        for column in property_columns
+                    },
+                }],
+            },
+        )
+    return tile_count
+
+def main():
+    """Build the hex population tile archive for the map front end"""
+    parquet_path = r"parquet_files/us_hexes_with_geonames.parquet"
+    output_path = "us_hexes.pmtiles"
+    signal_column = None  # e.g. "avg_minsignal" for all_OH_hexes_with_signal.parquet
+
+    print("Building hex vector tiles...")
+    tile_count = build_pmtiles(parquet_path, output_path, signal_column)
+    print(f"✅ Wrote {tile_count:,} tiles to {output_path}")
+
+if __name__ == "__main__":
+    pipeline_metrics.run_profiled(main)
@@ -0,0 +1,142 @@
+import numpy as np
+from h3.api import basic_int as h3_int
+
+from hex_ids import parent_ids, to_int_ids
+from pipeline_metrics import stage
+
+MEASURED = "measured"
+ESTIMATED = "estimated"
+# Coarse resolution used to skip population hexes far from any coverage
+NEAR_RES = 5
+# Per-row sample count columns recognised in coverage drops, in priority order
+SAMPLE_COUNT_COLUMNS = ("sample_count", "samples", "num_samples", "n_samples", "count")
+
+def _near_parents(covered_ids):
+    """Coarse parents of the covered cells plus one ring around them"""
+    parents = np.unique(parent_ids(covered_ids, NEAR_RES))
+    ring = [h3_int.grid_disk(int(p), 1) for p in parents]
+    return np.unique(np.fromiter((c for disk in ring for c in disk), dtype=np.uint64))
+
+def find_count_column(columns):
+    """First per-row sample count column present in a coverage table, or None"""
+    for column in SAMPLE_COUNT_COLUMNS:
+        if column in columns:
+            return column
+    return None
+
+def hex8_signal_stats(coverage_gdf, res=8, count_column="auto"):
+    """Signal per parent cell from res-9 coverage rows, weighted by sample count
+
+    Each res-9 row counts as count_column samples. With "auto" the first of
+    SAMPLE_COUNT_COLUMNS present is used. The *_US_hexes.parquet drops seen so
+    far only carry h3_res9_id and minsignal; without a count column every row
+    weighs 1 and the signal equals the plain groupby mean. The summed counts
+    are still returned and weight neighbors in neighbor_fill.
+    Returns uint64 ids sorted ascending with signal sums and sample counts.
+    """
+    if count_column == "auto":
+        count_column = find_count_column(coverage_gdf.columns)
+    with stage("hex8_signal_stats", res=res, count_column=count_column) as metrics:
+        ids = parent_ids(to_int_ids(coverage_gdf["h3_res9_id"]), res)
+        signal = coverage_gdf["minsignal"].to_numpy(dtype=np.float64)
+        if count_column:
+            counts = coverage_gdf[count_column].to_numpy(dtype=np.float64)
+        else:
+            counts = np.ones(len(signal))
+        valid = ~np.isnan(signal) & (counts > 0)
+        ids, signal, counts = ids[valid], signal[valid], counts[valid]
+
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        signal_sum = np.bincount(inverse, weights=signal * counts, minlength=len(unique_ids))
+        sample_count = np.bincount(inverse, weights=counts, minlength=len(unique_ids))
+        metrics.rows = len(unique_ids)
+    return unique_ids, signal_sum, sample_count
+
+def neighbor_fill(target_ids, covered_ids, signal_sum, sample_count, k=1):
+    """Estimate signal for uncovered cells from covered cells within k rings
+
+    Builds the sparse (target, neighbor) pair list with grid_disk over integer
+    ids and aggregates it with bincount. covered_ids must be sorted. Returns
+    the estimated signal (NaN where no neighbor is covered) and the number of
+    samples behind each estimate.
+    """
+    with stage("neighbor_fill", k=k) as metrics:
+        rows = []
+        neighbors = []
+        for i, cell in enumerate(target_ids.tolist()):
+            disk = h3_int.grid_disk(cell, k)
+            rows.append(np.full(len(disk), i, dtype=np.int64))
+            neighbors.append(np.fromiter(disk, dtype=np.uint64, count=len(disk)))
+        if rows:
+            rows = np.concatenate(rows)
+            neighbors = np.concatenate(neighbors)
+        else:
+            rows = np.empty(0, dtype=np.int64)
+            neighbors = np.empty(0, dtype=np.uint64)
+
+        # Keep only pairs whose neighbor has measured signal
+        pos = np.searchsorted(covered_ids, neighbors)
+        pos[pos == len(covered_ids)] = 0
+        hit = covered_ids[pos] == neighbors if len(covered_ids) else np.zeros(len(neighbors), dtype=bool)
+        rows, pos = rows[hit], pos[hit]
+
+        est_sum = np.bincount(rows, weights=signal_sum[pos], minlength=len(target_ids))
+        est_count = np.bincount(rows, weights=sample_count[pos], minlength=len(target_ids))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            estimate = np.where(est_count > 0, est_sum / est_count, np.nan)
+        metrics.rows = int((est_count > 0).sum())
+    return estimate, est_count
+
+def estimate_coverage(pop_df, coverage_gdf, k=1, signal_name="minsignal", count_column="auto"):
+    """Attach measured or neighbor-estimated signal to every population hex
+
+    Unlike an inner merge, population hexes without res-9 samples are kept
+    when a covered cell lies within k rings; their signal is estimated from
+    those neighbors. Hexes with nothing covered nearby are still dropped.
+    coverage_source records "measured" or "estimated" for each row.
+    """
+    covered_ids, signal_sum, sample_count = hex8_signal_stats(coverage_gdf, count_column=count_column)
+
+    with stage("estimate_coverage", k=k) as metrics:
+        # Callers looping over states can precompute h3_int once
+        if "h3_int" in pop_df.columns:
+            pop_ids = pop_df["h3_int"].to_numpy(dtype=np.uint64)
+        else:
+            pop_ids = to_int_ids(pop_df["h3"])
+        pos = np.searchsorted(covered_ids, pop_ids)
+        pos[pos == len(covered_ids)] = 0
+        measured = covered_ids[pos] == pop_ids if len(covered_ids) else np.zeros(len(pop_ids), dtype=bool)
+
+        signal = np.full(len(pop_ids), np.nan)
+        samples = np.zeros(len(pop_ids))
+        signal[measured] = signal_sum[pos[measured]] / sample_count[pos[measured]]
+        samples[measured] = sample_count[pos[measured]]
+
+        # Only fill cells near the measured area; the national population
+        # table would otherwise send every hex in the country through grid_disk
+        gaps = np.flatnonzero(~measured)
+        if k > 0 and len(covered_ids):
+            gaps = gaps[np.isin(parent_ids(pop_ids[gaps], NEAR_RES), _near_parents(covered_ids))]
+            estimate, est_count = neighbor_fill(pop_ids[gaps], covered_ids, signal_sum, sample_count, k)
+            signal[gaps] = estimate
+            samples[gaps] = est_count
+
+        # Select before assigning so the national table is never copied whole
+        keep = np.flatnonzero(~np.isnan(signal))
+        result = pop_df.iloc[keep].assign(**{
+            signal_name: signal[keep],
+            "sample_count": samples[keep],
+            "coverage_source": np.where(measured[keep], MEASURED, ESTIMATED),
+        })
+        metrics.rows = len(result)
+    return result
+
+def coverage_summary(estimated_df, population_column="population"):
+    """Population with measured signal vs population with an estimated signal"""
+    by_source = estimated_df.groupby("coverage_source")[population_column].sum()
+    return {
+        "measured_population": float(by_source.get(MEASURED, 0)),
+        "estimated_population": float(by_source.get(ESTIMATED, 0)),
+        "measured_hexes": int((estimated_df["coverage_source"] == MEASURED).sum()),
+        "estimated_hexes": int((estimated_df["coverage_source"] == ESTIMATED).sum()),
+    }
@@ -0,0 +1,231 @@
+import glob
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import pipeline_metrics
+from coverage_estimation import find_count_column, hex8_signal_stats
+from hex_ids import to_int_ids, to_str_ids
+from pipeline_metrics import stage
+
+SNAPSHOT_DIR = Path("coverage_snapshots")
+BANDS = ("none", "great", "good", "poor")
+DIFF_BATCH_SIZE = 1_000_000
+
+def signal_band(signal):
+    """Band code per signal: 1 great (>= -90), 2 good (-100..-90), 3 poor (<= -100), 0 no data"""
+    signal = np.asarray(signal, dtype=np.float64)
+    return np.select(
+        [np.isnan(signal), signal >= -90, signal > -100],
+        [0, 1, 2],
+        default=3,
+    ).astype(np.int8)
+
+def snapshot_path(state, label, snapshot_dir=SNAPSHOT_DIR):
+    return Path(snapshot_dir) / state / f"{state}_{label}.parquet"
+
+def _source_key(hex_file):
+    """Identify a drop by mtime and size, like hex_table_cache.cache_path_for"""
+    st = os.stat(hex_file)
+    return str(st.st_mtime_ns), str(st.st_size)
+
+def take_snapshot(hex_file, label=None, snapshot_dir=SNAPSHOT_DIR):
+    """Store per-res8 signal aggregates of one *_US_hexes.parquet drop, sorted by H3 id"""
+    state = os.path.basename(hex_file).split('_')[0]
+    mtime_ns, size = _source_key(hex_file)
+    if label is None:
+        # Date first so labels sort chronologically; mtime and size make every
+        # distinct drop (even two on the same day) its own snapshot
+        date = time.strftime("%Y%m%d", time.localtime(int(mtime_ns) / 1e9))
+        label = f"{date}-{mtime_ns}-{size}"
+    output_path = snapshot_path(state, label, snapshot_dir)
+    if output_path.exists():
+        metadata = pq.read_schema(output_path).metadata or {}
+        stored = (
+            metadata.get(b"source", b"").decode(),
+            metadata.get(b"source_mtime_ns", b"").decode(),
+            metadata.get(b"source_size", b"").decode(),
+        )
+        if stored != (str(hex_file), mtime_ns, size):
+            print(f"⚠️ Snapshot {output_path} was built from {stored[0] or 'an unknown source'} "
+                  f"(mtime_ns={stored[1]}, size={stored[2]}), not the current {hex_file}; "
+                  f"keeping the existing snapshot")
+        return output_path
+
+    columns = ["h3_res9_id", "minsignal"]
+    count_column = find_count_column(pq.read_schema(hex_file).names)
+    if count_column:
+        columns.append(count_column)
+    coverage_df = pipeline_metrics.read_parquet(hex_file, geo=False, columns=columns)
+    ids, signal_sum, sample_count = hex8_signal_stats(coverage_df, count_column=count_column)
+
+    table = pa.table({
+        "h3_int": ids,
+        "avg_signal": signal_sum / sample_count,
+        "sample_count": sample_count,
+    }, metadata={
+        "source": str(hex_file),
+        "source_mtime_ns": mtime_ns,
+        "source_size": size,
+        "state": state,
+        "label": label,
+    })
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(table, output_path)
+    print(f"📸 Snapshot {state} {label}: {len(ids):,} hexes -> {output_path}")
+    return output_path
+
+def list_snapshots(state, snapshot_dir=SNAPSHOT_DIR):
+    """Snapshot files for a state, oldest label first"""
+    return sorted(Path(snapshot_dir).glob(f"{state}/{state}_*.parquet"))
+
+def _batches(path, batch_size):
+    """Yield (ids, avg_signal) array pairs from a sorted snapshot file"""
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=["h3_int", "avg_signal"]):
+        yield (
+            batch.column(0).to_numpy().astype(np.uint64),
+            batch.column(1).to_numpy(zero_copy_only=False),
+        )
+
+def _merge_join(old_batches, new_batches):
+    """Full outer join of two streams of sorted, unique ids
+
+    Yields (ids, old_signal, new_signal) with NaN for ids missing on one side.
+    Only rows up to the smaller of the two buffered maximum ids are joined each
+    step, so each file is read once and memory stays at about one batch per side.
+    """
+    empty = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.float64))
+    old_buf, new_buf = empty, empty
+    old_done = new_done = False
+    while True:
+        while not old_done and len(old_buf[0]) == 0:
+            old_buf = next(old_batches, None)
+            old_done = old_buf is None
+            old_buf = empty if old_done else old_buf
+        while not new_done and len(new_buf[0]) == 0:
+            new_buf = next(new_batches, None)
+            new_done = new_buf is None
+            new_buf = empty if new_done else new_buf
+        if len(old_buf[0]) == 0 and len(new_buf[0]) == 0:
+            return
+
+        # Everything at or below bound is present in both buffers
+        bound = np.uint64(np.iinfo(np.uint64).max)
+        if not old_done:
+            bound = min(bound, old_buf[0][-1])
+        if not new_done:
+            bound = min(bound, new_buf[0][-1])
+        old_cut = np.searchsorted(old_buf[0], bound, side="right")
+        new_cut = np.searchsorted(new_buf[0], bound, side="right")
+        old_ids, old_signal = old_buf[0][:old_cut], old_buf[1][:old_cut]
+        new_ids, new_signal = new_buf[0][:new_cut], new_buf[1][:new_cut]
+        old_buf = (old_buf[0][old_cut:], old_buf[1][old_cut:])
+        new_buf = (new_buf[0][new_cut:], new_buf[1][new_cut:])
+
+        ids = np.union1d(old_ids, new_ids)
+        joined_old = np.full(len(ids), np.nan)
+        joined_new = np.full(len(ids), np.nan)
+        joined_old[np.searchsorted(ids, old_ids)] = old_signal
+        joined_new[np.searchsorted(ids, new_ids)] = new_signal
+        yield ids, joined_old, joined_new
+
+def load_population_lookup(parquet_path):
+    """Population per hex as (sorted uint64 ids, population) arrays"""
+    pop_df = pipeline_metrics.read_parquet(parquet_path, geo=False, columns=["h3", "population"])
+    ids = to_int_ids(pop_df["h3"])
+    order = np.argsort(ids)
+    return ids[order], pop_df["population"].to_numpy(dtype=np.float64)[order]
+
+def diff_snapshots(old_path, new_path, population=None, output_path=None, batch_size=DIFF_BATCH_SIZE):
+    """Compare two snapshots in one sorted-key merge pass
+
+    Returns band transition matrices (hex counts and population, indexed
+    [old band, new band] in BANDS order). If output_path is given, per-hex
+    rows (signal delta and bands) are streamed to that parquet file.
+    """
+    hex_moves = np.zeros((len(BANDS), len(BANDS)), dtype=np.int64)
+    pop_moves = np.zeros((len(BANDS), len(BANDS)), dtype=np.float64)
+    writer = None
+    with stage("diff_snapshots", old=str(old_path), new=str(new_path)) as metrics:
+        rows = 0
+        try:
+            for ids, old_signal, new_signal in _merge_join(_batches(old_path, batch_size), _batches(new_path, batch_size)):
+                old_band = signal_band(old_signal)
+                new_band = signal_band(new_signal)
+                if population is not None:
+                    pop_ids, pop_values = population
+                    pos = np.searchsorted(pop_ids, ids)
+                    pos[pos == len(pop_ids)] = 0
+                    pop = np.where(pop_ids[pos] == ids, pop_values[pos], 0.0)
+                else:
+                    pop = np.zeros(len(ids))
+                np.add.at(hex_moves, (old_band, new_band), 1)
+                np.add.at(pop_moves, (old_band, new_band), pop)
+                rows += len(ids)
+
+                if output_path is not None:
+                    table = pa.table({
+                        "h3": to_str_ids(ids),
+                        "old_signal": old_signal,
+                        "new_signal": new_signal,
+                        "signal_delta": new_signal - old_signal,
+                        "old_band": np.take(BANDS, old_band),
+                        "new_band": np.take(BANDS, new_band),
+                        "population": pop,
+                    })
+                    if writer is None:
+                        writer = pq.ParquetWriter(output_path, table.schema)
+                    writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        metrics.rows = rows
+
+    return {
+        "hexes": pd.DataFrame(hex_moves, index=BANDS, columns=BANDS),
+        "population": pd.DataFrame(pop_moves, index=BANDS, columns=BANDS),
+    }
+
+def print_diff_summary(state, diff):
+    """Print band totals before/after and the population that changed band"""
+    pop_moves = diff["population"]
+    print(f"\n📈 {state} Coverage Change:")
+    for band in BANDS[1:]:
+        before = pop_moves.loc[band].sum()
+        after = pop_moves[band].sum()
+        print(f"{band.title():>6}: {before:,.0f} -> {after:,.0f} ({after - before:+,.0f})")
+    for old_band in BANDS:
+        for new_band in BANDS:
+            moved = pop_moves.loc[old_band, new_band]
+            if old_band != new_band and moved > 0:
+                print(f"  {old_band} -> {new_band}: {moved:,.0f} people "
+                      f"({diff['hexes'].loc[old_band, new_band]:,} hexes)")
+
+def main():
+    """Snapshot the current state drops and diff each against its previous snapshot"""
+    population = load_population_lookup("parquet_files/us_hexes_with_geonames.parquet")
+    output_dir = SNAPSHOT_DIR / "diffs"
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    for hex_file in glob.glob("parquet_files/*_US_hexes.parquet"):
+        new_path = take_snapshot(hex_file)
+        state = new_path.parent.name
+        snapshots = list_snapshots(state)
+        position = snapshots.index(new_path)
+        if position == 0:
+            print(f"ℹ️ {state}: no earlier snapshot to compare against")
+            continue
+        old_path = snapshots[position - 1]
+        diff_file = output_dir / f"{old_path.stem}_vs_{new_path.stem.split('_', 1)[1]}.parquet"
+        diff = diff_snapshots(old_path, new_path, population, diff_file)
+        print_diff_summary(state, diff)
+        print(f"💾 Per-hex changes saved to {diff_file}")
+
+if __name__ == "__main__":
+    pipeline_metrics.run_profiled(main)
@@ -1,27 +1,39 @@
 import pandas as pd
-import geopandas as gpd
 import h3
 
+import pipeline_metrics
+from hex_table_cache import read_hex_table
+from pipeline_metrics import stage
+
 # Step 1: Load coverage data (hex9s with signal)
-coverage_gdf = gpd.read_parquet(r"parquet_files/ID_US_hexes.parquet")
+coverage_gdf = pipeline_metrics.read_parquet(r"parquet_files/ID_US_hexes.parquet")
 
 # Step 2: Add parent hex8 ID
-coverage_gdf["h3"] = coverage_gdf["h3_res9_id"].apply(lambda h: h3.h3_to_parent(h, 8))
+with stage("cell_to_parent") as metrics:
+    coverage_gdf["h3"] = coverage_gdf["h3_res9_id"].apply(lambda h: h3.h3_to_parent(h, 8))
+    metrics.rows = len(coverage_gdf)
 
 # Step 3: Group by hex8 and average the signal
-hex8_signal = (
-    coverage_gdf
-    .groupby("h3")["minsignal"]
-    .mean()
-    .reset_index()
-    .rename(columns={"minsignal": "avg_minsignal"})
-)
+with stage("groupby_signal") as metrics:
+    hex8_signal = (
+        coverage_gdf
+        .groupby("h3")["minsignal"]
+        .mean()
+        .reset_index()
+        .rename(columns={"minsignal": "avg_minsignal"})
+    )
+    metrics.rows = len(hex8_signal)
 
 # Step 4: Load population hex8 data
-pop_df = gpd.read_parquet(r"parquet_files/us_hexes_with_geonames.parquet")
+pop_df = read_hex_table(
+    r"parquet_files/us_hexes_with_geonames.parquet",
+    columns=["h3", "population", "city", "county", "state"],
+)
 
 # Merge on H3 index
-merged = pop_df.merge(hex8_signal, on="h3", how="inner")
+with stage("merge_population") as metrics:
+    merged = pop_df.merge(hex8_signal, on="h3", how="inner")
+    metrics.rows = len(merged)
 
 # Step 5: Sort by worst signal first
 worst_hexes = merged.sort_values(by="avg_minsignal").copy()
@@ -0,0 +1,160 @@
+import json
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import h3
+import numpy as np
+import pandas as pd
+
+from pipeline_metrics import stage
+
+# Columns that never go into exported properties (geometry is rebuilt from h3)
+SKIP_COLUMNS = ('geometry', 'centroid')
+DEFAULT_CHUNK_SIZE = 50_000
+
+def _property_columns(df, h3_column, columns):
+    """Attribute columns to export, keeping the h3 id first"""
+    if columns is None:
+        columns = [c for c in df.columns if c not in SKIP_COLUMNS]
+    columns = [c for c in columns if c != h3_column]
+    return [h3_column] + columns
+
+def _plain_records(df, columns):
+    """Row values as plain Python objects, with NaN/NaT converted to None"""
+    values = df[columns].astype(object)
+    values = values.where(pd.notna(values), None)
+    return values.values.tolist()
+
+def _chunks(df, h3_column, columns, chunk_size):
+    """Yield (h3 ids, property rows) slices without copying the whole frame"""
+    for start in range(0, len(df), chunk_size):
+        part = df.iloc[start:start + chunk_size]
+        yield part[h3_column].tolist(), _plain_records(part, columns)
+
+def _closed_rings(cells):
+    """Yield (chunk positions, (m, n + 1, 2) lng/lat array) per vertex count
+
+    Boundaries are grouped by vertex count (hexagons, pentagons, and the odd
+    distorted cell) so each group is closed and reordered in one numpy step.
+    """
+    boundaries = [h3.cell_to_boundary(cell) for cell in cells]
+    counts = np.fromiter((len(b) for b in boundaries), dtype=np.int64, count=len(boundaries))
+    for n in np.unique(counts).tolist():
+        positions = np.flatnonzero(counts == n)
+        rings = np.array([boundaries[i] for i in positions], dtype=np.float64)
+        rings = np.concatenate([rings, rings[:, :1]], axis=1)[:, :, ::-1]
+        yield positions, rings
+
+def _geojson_chunk(args):
+    """Render one chunk of hexes as comma-separated GeoJSON Feature strings"""
+    cells, rows, columns, precision = args
+    coords = [None] * len(cells)
+    for positions, rings in _closed_rings(cells):
+        # One format call per ring; the format string sets the precision
+        ring_format = ",".join([f"[%.{precision}f,%.{precision}f]"] * rings.shape[1])
+        flat = rings.reshape(len(positions), -1).tolist()
+        for i, values in zip(positions.tolist(), flat):
+            coords[i] = ring_format % tuple(values)
+    features = []
+    for ring, row in zip(coords, rows):
+        properties = json.dumps(dict(zip(columns, row)), default=str)
+        features.append(
+            '{"type":"Feature","properties":' + properties
+            + ',"geometry":{"type":"Polygon","coordinates":[[' + ring + ']]}}'
+        )
+    return ",\n".join(features)
+
+def _wkb_chunk(args):
+    """Encode one chunk of hexes as little-endian WKB polygons"""
+    cells, precision = args
+    geometries = [None] * len(cells)
+    for positions, rings in _closed_rings(cells):
+        rings = np.round(rings, precision).astype('<f8')
+        header = struct.pack("<BIII", 1, 3, 1, rings.shape[1])
+        for i, ring in zip(positions.tolist(), rings):
+            geometries[i] = header + ring.tobytes()
+    return geometries
+
+def _map_chunks(func, chunks, workers):
+    """Run func over chunks in order, in a process pool when workers > 1
+
+    Only a couple of chunks per worker are in flight at a time, so the chunk
+    generator is consumed (and its rows built and pickled) as output is written.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+            pending.append(executor.submit(func, chunk))
+        while pending:
+            yield pending.popleft().result()
+
+def write_hex_geojson(df, output_path, h3_column='h3', columns=None, precision=6,
+                      chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """Stream hexes to a GeoJSON FeatureCollection built straight from H3 ids
+
+    Polygons come from h3.cell_to_boundary rather than the geometry column, so
+    no Shapely objects are created. Chunks are rendered in parallel and written
+    in order as they finish.
+    """
+    columns = _property_columns(df, h3_column, columns)
+    with stage("write_hex_geojson", path=str(output_path), workers=workers) as metrics:
+        chunks = (
+            (cells, rows, columns, precision)
+            for cells, rows in _chunks(df, h3_column, columns, chunk_size)
+        )
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write('{"type":"FeatureCollection",'
+                    '"crs":{"type":"name","properties":{"name":"urn:ogc:def:crs:OGC:1.3:CRS84"}},'
+                    '"features":[\n')
+            first = True
+            for text in _map_chunks(_geojson_chunk, chunks, workers):
+                if not text:
+                    continue
+                if not first:
+                    f.write(",\n")
+                f.write(text)
+                first = False
+            f.write("\n]}\n")
+        metrics.rows = len(df)
+        metrics.fields['bytes_written'] = os.path.getsize(output_path)
+    return output_path
+
+def write_hex_flatgeobuf(df, output_path, h3_column='h3', columns=None, precision=6,
+                         chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    """Write hexes to FlatGeobuf from H3 ids using WKB built without Shapely
+
+    Requires pyogrio >= 0.8 with GDAL >= 3.8 for Arrow writes.
+    """
+    try:
+        import pyarrow as pa
+        from pyogrio import write_arrow
+    except ImportError as e:
+        raise ImportError("FlatGeobuf export requires pyarrow and pyogrio (pip install pyogrio)") from e
+
+    columns = _property_columns(df, h3_column, columns)
+    with stage("write_hex_flatgeobuf", path=str(output_path), workers=workers) as metrics:
+        chunks = (
+            (df[h3_column].iloc[start:start + chunk_size].tolist(), precision)
+            for start in range(0, len(df), chunk_size)
+        )
+        geometries = []
+        for part in _map_chunks(_wkb_chunk, chunks, workers):
+            geometries.extend(part)
+
+        table = pa.Table.from_pandas(pd.DataFrame(df[columns]), preserve_index=False)
+        table = table.append_column('geometry', pa.array(geometries, type=pa.binary()))
+        write_arrow(table, str(output_path), driver='FlatGeobuf', geometry_name='geometry',
+                    geometry_type='Polygon', crs='EPSG:4326')
+        metrics.rows = len(df)
+        metrics.fields['bytes_written'] = os.path.getsize(output_path)
+    return output_path
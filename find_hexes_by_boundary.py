@@ -1,12 +1,17 @@
 import geopandas as gpd
 from pathlib import Path
 
+import pipeline_metrics
+from hex_table_cache import read_hex_table
+from pipeline_metrics import instrumented
+
 def load_hex_data():
     """Load the hex data from parquet file"""
     columns = ['h3', 'population', 'geometry', 'centroid', 'lat', 'lon', 'density_per_mi2']
-    gdf = gpd.read_parquet(r"parquet_files\us_hexes_with_geonames.parquet", columns=columns)
+    gdf = read_hex_table(r"parquet_files\us_hexes_with_geonames.parquet", columns=columns)
     return gdf
 
+@instrumented("load_county_boundaries")
 def load_county_boundaries():
     """Load county boundaries for the specified counties"""
     # Define state FIPS codes
@@ -47,6 +52,7 @@ def create_output_folder():
     output_dir.mkdir(exist_ok=True)
     return output_dir
 
+@instrumented("find_hexes_in_boundary")
 def find_hexes_in_boundary(hex_gdf, boundary_gdf):
     """Find hexes that intersect with a boundary"""
     # Ensure both GeoDataFrames are in the same CRS
@@ -100,4 +106,4 @@ def main():
     save_county_hexes(hex_gdf, county_boundaries, output_dir)
 
 if __name__ == "__main__":
-    main()
+    pipeline_metrics.run_profiled(main)
@@ -2,12 +2,18 @@ import geopandas as gpd
 import json
 from pathlib import Path
 
+import pipeline_metrics
+from hex_table_cache import read_hex_table
+from fast_hex_export import write_hex_flatgeobuf, write_hex_geojson
+from pipeline_metrics import instrumented
+
 def load_hex_data():
     """Load the hex data from parquet file"""
     columns = ['h3', 'population', 'geometry', 'centroid', 'lat', 'lon', 'density_per_mi2']
-    gdf = gpd.read_parquet(r"parquet_files\ng_hexes_with_coordinates.parquet", columns=columns)
+    gdf = read_hex_table(r"parquet_files\ng_hexes_with_coordinates.parquet", columns=columns)
     return gdf
 
+@instrumented("load_geojson_boundary")
 def load_geojson_boundary(geojson_path):
     """Load boundary from GeoJSON file"""
     try:
@@ -61,6 +67,7 @@ def create_output_folder():
     output_dir.mkdir(exist_ok=True)
     return output_dir
 
+@instrumented("find_hexes_in_boundary")
 def find_hexes_in_boundary(hex_gdf, boundary_gdf):
     """Find hexes that intersect with the boundary"""
     
@@ -88,8 +95,9 @@ def find_hexes_in_boundary(hex_gdf, boundary_gdf):
     print(f"Found {len(intersecting_hexes)} intersecting hexes")
     return intersecting_hexes
 
-def save_hexes(hex_gdf, boundary_gdf, output_dir, boundary_name="geojson_boundary"):
-    """Save all hexes within the boundary"""
+def save_hexes(hex_gdf, boundary_gdf, output_dir, boundary_name="geojson_boundary", geojson_precision=6,
+               export_flatgeobuf=False):
+    """Save all hexes within the boundary (optionally also as FlatGeobuf)"""
     
     # Find hexes within boundary
     boundary_hexes = find_hexes_in_boundary(hex_gdf, boundary_gdf)
@@ -100,19 +108,18 @@ def save_hexes(hex_gdf, boundary_gdf, output_dir, boundary_name="geojson_boundar
         boundary_hexes.to_parquet(output_file)
         print(f"✅ Saved {len(boundary_hexes):,} hexes to {output_file}")
         
-        # Create a clean version for GeoJSON export (only one geometry column)
-        geojson_hexes = boundary_hexes.copy()
-        
-        # Drop the centroid column if it exists (keep only the main geometry)
-        if 'centroid' in geojson_hexes.columns:
-            geojson_hexes = geojson_hexes.drop(columns=['centroid'])
-            print("  - Removed centroid column for GeoJSON export")
-        
-        # Also save as GeoJSON for visualization
+        # Also save as GeoJSON for visualization, streamed straight from the
+        # h3 ids (geometry and centroid columns are not copied or serialized)
         geojson_output = output_dir / f"hexes_in_{boundary_name}.geojson"
-        geojson_hexes.to_file(geojson_output, driver='GeoJSON')
+        write_hex_geojson(boundary_hexes, geojson_output, precision=geojson_precision)
         print(f"✅ Saved hexes as GeoJSON: {geojson_output}")
         
+        # FlatGeobuf is much faster to load in QGIS for country-sized outputs
+        if export_flatgeobuf:
+            fgb_output = output_dir / f"hexes_in_{boundary_name}.fgb"
+            write_hex_flatgeobuf(boundary_hexes, fgb_output, precision=geojson_precision)
+            print(f"✅ Saved hexes as FlatGeobuf: {fgb_output}")
+        
         # Print summary
         print(f"\n{'='*60}")
         print(f"SUMMARY")
@@ -142,6 +149,7 @@ def main():
     
     # Alternative: Create boundary from coordinates
     use_coordinates = False  # Set to True to use coordinate method instead
+    export_flatgeobuf = False  # Set to True to also write a .fgb (needs pyogrio)
     
     # Create output folder
     output_dir = create_output_folder()
@@ -181,7 +189,8 @@ def main():
     # Process and save hexes
     print("\nFinding hexes within boundary...")
     boundary_name = "geojson_boundary" if not use_coordinates else "nigeria_bbox"
-    result_hexes = save_hexes(hex_gdf, boundary_gdf, output_dir, boundary_name)
+    result_hexes = save_hexes(hex_gdf, boundary_gdf, output_dir, boundary_name,
+                              export_flatgeobuf=export_flatgeobuf)
     
     if result_hexes is not None:
         print(f"\n🎉 Successfully processed GeoJSON boundary!")
@@ -197,4 +206,4 @@ def main():
         print("\n❌ No hexes found within the boundary")
 
 if __name__ == "__main__":
-    main()
+    pipeline_metrics.run_profiled(main)
@@ -1,13 +1,23 @@
 import geopandas as gpd
+import os
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from shapely.geometry import box
+
+import pipeline_metrics
+from hex_ids import parent_ids, to_int_ids
+from hex_table_cache import read_hex_table
+from pipeline_metrics import instrumented
 
 def load_hex_data():
     """Load the hex data from parquet file"""
     columns = ['h3', 'population', 'geometry', 'centroid', 'lat', 'lon', 'density_per_mi2']
-    gdf = gpd.read_parquet(r"parquet_files\ng_hexes_with_coordinates.parquet", columns=columns)
+    gdf = read_hex_table(r"parquet_files\ng_hexes_with_coordinates.parquet", columns=columns)
     return gdf
 
-def load_shapefile_boundary():
+@instrumented("load_shapefile_boundary")
+def load_shapefile_boundary(dissolve=True):
     """Load the shapefile boundary"""
     try:
         # Load the shapefile
@@ -20,7 +30,9 @@ def load_shapefile_boundary():
         # 1. Use the first feature, or
         # 2. Combine all features into one boundary
         
-        if len(boundary) > 1:
+        # Partitioned runs skip this: each partition only sees the clipped
+        # pieces it needs, and duplicate hexes are dropped after the join
+        if dissolve and len(boundary) > 1:
             print(f"Multiple features found. Combining {len(boundary)} features into single boundary...")
             # Dissolve all features into one
             boundary = boundary.dissolve()
@@ -38,6 +50,7 @@ def create_output_folder():
     output_dir.mkdir(exist_ok=True)
     return output_dir
 
+@instrumented("find_hexes_in_boundary")
 def find_hexes_in_boundary(hex_gdf, boundary_gdf):
     """Find hexes that intersect with a boundary"""
     
@@ -65,11 +78,101 @@ def find_hexes_in_boundary(hex_gdf, boundary_gdf):
     print(f"Found {len(intersecting_hexes)} intersecting hexes")
     return intersecting_hexes
 
-def save_hexes(hex_gdf, boundary_gdf, output_dir):
+# Boundary shared by every partition, set once per worker process
+_worker_boundary = None
+
+def _init_partition_worker(boundary_gdf):
+    global _worker_boundary
+    _worker_boundary = boundary_gdf
+
+def _find_hexes_in_partition(part_gdf, bounds):
+    """Join one partition's hexes against the boundary clipped to its bbox"""
+    # Only the features whose bbox touches the partition are copied and clipped
+    candidates = _worker_boundary.sindex.query(box(*bounds))
+    if len(candidates) == 0:
+        return part_gdf.iloc[:0]
+    clipped = _worker_boundary.iloc[candidates].copy()
+    clipped[clipped.geometry.name] = clipped.geometry.clip_by_rect(*bounds)
+    clipped = clipped[~clipped.geometry.is_empty]
+    if clipped.empty:
+        return part_gdf.iloc[:0]
+    return gpd.sjoin(part_gdf, clipped, how='inner', predicate='intersects')
+
+@instrumented("find_hexes_in_boundary_partitioned")
+def find_hexes_in_boundary_partitioned(hex_gdf, boundary_gdf, partition_res=3, workers=None):
+    """Find intersecting hexes partition by partition in a process pool
+
+    Hexes are grouped by their H3 parent at partition_res; each partition is
+    joined against the boundary clipped to the partition's bounding box, so no
+    worker ever handles the whole country. Partitions whose box misses the
+    boundary are skipped without being sent to a worker.
+
+    Memory is bounded in the workers only: the parent still holds the full
+    hex table passed in, plus its per-hex bounds used to size the partitions.
+    """
+    if boundary_gdf.crs is None:
+        print("⚠️  Shapefile has no CRS defined. Assuming WGS84 (EPSG:4326)...")
+        boundary_gdf = boundary_gdf.set_crs('EPSG:4326')
+    output_crs = boundary_gdf.crs
+    
+    # Reproject the (small) boundary to the hex CRS instead of the whole hex table
+    if hex_gdf.crs != boundary_gdf.crs:
+        print(f"Converting boundary from {boundary_gdf.crs} to {hex_gdf.crs}...")
+        boundary_gdf = boundary_gdf.to_crs(hex_gdf.crs)
+    
+    partition_ids = parent_ids(to_int_ids(hex_gdf['h3']), partition_res)
+    hex_bounds = hex_gdf.geometry.bounds
+    partition_bounds = hex_bounds.groupby(partition_ids).agg(
+        {'minx': 'min', 'miny': 'min', 'maxx': 'max', 'maxy': 'max'}
+    )
+    partition_rows = pd.Series(range(len(hex_gdf))).groupby(partition_ids).indices
+    
+    # Skip partitions whose bbox does not touch any boundary feature
+    boundary_index = boundary_gdf.sindex
+    tasks = [
+        (partition, tuple(bounds))
+        for partition, bounds in partition_bounds.iterrows()
+        if len(boundary_index.query(box(*bounds)))
+    ]
+    print(f"Processing {len(tasks):,} of {len(partition_bounds):,} res-{partition_res} partitions...")
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_partition_worker,
+                             initargs=(boundary_gdf,)) as executor:
+        # Keep only a couple of partitions per worker in flight to bound memory
+        pending = set()
+        for partition, bounds in tasks:
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+            part_gdf = hex_gdf.iloc[partition_rows[partition]]
+            pending.add(executor.submit(_find_hexes_in_partition, part_gdf, bounds))
+        results.extend(future.result() for future in wait(pending).done)
+    
+    results = [r for r in results if not r.empty]
+    if not results:
+        return hex_gdf.iloc[:0]
+    # Partitions finish in any order; restore the hex table order
+    intersecting_hexes = pd.concat(results).sort_index(kind='stable')
+    
+    # Remove duplicates based on h3 index (hexes touching several features)
+    intersecting_hexes = intersecting_hexes.drop_duplicates(subset=['h3'])
+    if intersecting_hexes.crs != output_crs:
+        intersecting_hexes = intersecting_hexes.to_crs(output_crs)
+    
+    print(f"Found {len(intersecting_hexes)} intersecting hexes")
+    return intersecting_hexes
+
+def save_hexes(hex_gdf, boundary_gdf, output_dir, partition_res=None, workers=None):
     """Save all hexes within the boundary"""
     
     # Find hexes within boundary
-    boundary_hexes = find_hexes_in_boundary(hex_gdf, boundary_gdf)
+    if partition_res is None:
+        boundary_hexes = find_hexes_in_boundary(hex_gdf, boundary_gdf)
+    else:
+        boundary_hexes = find_hexes_in_boundary_partitioned(hex_gdf, boundary_gdf, partition_res, workers)
     
     if not boundary_hexes.empty:
         # Save to parquet
@@ -96,6 +199,14 @@ def main():
     print("Shapefile Hex Finder")
     print("=" * 50)
     
+    # Configuration
+    # Set to an H3 resolution (e.g. 3) to split the hex table by parent cells
+    # and process partitions in parallel. The boundary is then not dissolved,
+    # so each hex carries the attributes (and index_right) of the first
+    # boundary feature it matched instead of the dissolved boundary's
+    partition_res = None
+    workers = None  # defaults to all cores
+    
     # Create output folder
     output_dir = create_output_folder()
     
@@ -105,7 +216,7 @@ def main():
     print(f"Loaded {len(hex_gdf):,} hexes")
     
     print("\nLoading shapefile boundary...")
-    boundary_gdf = load_shapefile_boundary()
+    boundary_gdf = load_shapefile_boundary(dissolve=partition_res is None)
     
     if boundary_gdf is None:
         print("Failed to load shapefile. Exiting.")
@@ -120,7 +231,7 @@ def main():
     
     # Process and save hexes
     print("\nFinding hexes within boundary...")
-    result_hexes = save_hexes(hex_gdf, boundary_gdf, output_dir)
+    result_hexes = save_hexes(hex_gdf, boundary_gdf, output_dir, partition_res, workers)
     
     if result_hexes is not None:
         print(f"\n✅ Successfully processed shapefile!")
@@ -130,4 +241,4 @@ def main():
         print("\n❌ No hexes found within the boundary")
 
 if __name__ == "__main__":
-    main()
+    pipeline_metrics.run_profiled(main)
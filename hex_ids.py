@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+# H3 index bit layout: 4 resolution bits at 52-55, then fifteen 3-bit digits
+# with digit 15 in the lowest bits. Unused digits below the resolution are 7.
+RES_OFFSET = 52
+RES_MASK = np.uint64(0xF << RES_OFFSET)
+DIGIT_BITS = 3
+MAX_RES = 15
+
+def to_int_ids(cells):
+    """Convert H3 hex strings to a uint64 array (integer ids pass through)"""
+    if isinstance(cells, (pd.Series, pd.Index)):
+        cells = cells.to_numpy()
+    cells = np.asarray(cells)
+    if cells.dtype.kind in "iu":
+        return cells.astype(np.uint64)
+    return np.fromiter((int(c, 16) for c in cells), dtype=np.uint64, count=len(cells))
+
+def to_str_ids(ids):
+    """Convert uint64 H3 ids back to the hex strings used in the parquet files"""
+    return np.array([format(int(i), "x") for i in ids], dtype=object)
+
+def resolutions(ids):
+    """Resolution of each uint64 H3 id"""
+    return ((ids & RES_MASK) >> np.uint64(RES_OFFSET)).astype(np.int8)
+
+def parent_ids(ids, res):
+    """Vectorized cell_to_parent for uint64 H3 ids at or finer than res"""
+    ids = np.asarray(ids, dtype=np.uint64)
+    unused_digits = np.uint64((1 << ((MAX_RES - res) * DIGIT_BITS)) - 1)
+    return (ids & ~RES_MASK) | np.uint64(res << RES_OFFSET) | unused_digits
@@ -0,0 +1,115 @@
+import json
+import os
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import pipeline_metrics
+from pipeline_metrics import stage
+
+# Set HEX_ARROW_CACHE=0 to bypass the cache and read the parquet directly
+CACHE_ENV = "HEX_ARROW_CACHE"
+CACHE_DIR_NAME = ".arrow_cache"
+
+def cache_path_for(parquet_path):
+    """Cache file for a parquet, keyed by its mtime and size"""
+    parquet_path = Path(parquet_path)
+    st = parquet_path.stat()
+    return parquet_path.parent / CACHE_DIR_NAME / f"{parquet_path.stem}.{st.st_mtime_ns}.{st.st_size}.arrow"
+
+def _remove_stale(parquet_path, cache_path):
+    """Delete caches of older versions of the same parquet"""
+    for old in cache_path.parent.glob(f"{Path(parquet_path).stem}.*.*.arrow"):
+        if old != cache_path:
+            try:
+                old.unlink()
+            except OSError:
+                # Still mapped by another process (Windows); retry on a later build
+                pass
+
+def build_cache(parquet_path):
+    """Convert a parquet file once into an uncompressed Arrow IPC file"""
+    cache_path = cache_path_for(parquet_path)
+    if cache_path.exists():
+        return cache_path
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    with stage("build_arrow_cache", path=str(parquet_path)) as metrics:
+        metrics.bytes_read = os.path.getsize(parquet_path)
+        parquet_file = pq.ParquetFile(parquet_path)
+        # Write row group by row group so the whole table is never decoded at once
+        with pa.OSFile(str(tmp_path), 'wb') as sink:
+            with pa.ipc.new_file(sink, parquet_file.schema_arrow) as writer:
+                for i in range(parquet_file.num_row_groups):
+                    writer.write_table(parquet_file.read_row_group(i))
+        try:
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # Another process finished the same cache first
+            tmp_path.unlink(missing_ok=True)
+        metrics.rows = parquet_file.metadata.num_rows
+        metrics.fields['cache_path'] = str(cache_path)
+    _remove_stale(parquet_path, cache_path)
+    return cache_path
+
+def open_cached_table(parquet_path, columns=None):
+    """Memory-map the cached Arrow table (zero-copy; pages shared via the OS cache)"""
+    cache_path = build_cache(parquet_path)
+    with stage("map_arrow_cache", path=str(cache_path), columns=columns) as metrics:
+        source = pa.memory_map(str(cache_path), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+        metrics.rows = table.num_rows
+    return table
+
+def _geometry_columns(schema):
+    """GeoParquet geo metadata and its geometry column names, or (None, [])"""
+    metadata = schema.metadata or {}
+    if b"geo" not in metadata:
+        return None, []
+    geo = json.loads(metadata[b"geo"])
+    return geo, list(geo["columns"])
+
+def _to_frame(table):
+    """Turn a mapped Arrow table into a DataFrame, or a GeoDataFrame if it has geometry
+
+    Without geometry, columns stay Arrow-backed (pd.ArrowDtype) and reference
+    the mapped file directly, so nothing is decoded into Python objects. With
+    geometry, WKB has to be decoded into Shapely objects in every process, and
+    the other columns are converted to regular pandas dtypes for geopandas.
+    """
+    geo, geometry_columns = _geometry_columns(table.schema)
+    geometry_columns = [c for c in geometry_columns if c in table.column_names]
+    if not geometry_columns:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+    df = table.drop(geometry_columns).to_pandas(split_blocks=True)
+    for column in geometry_columns:
+        crs = geo["columns"][column].get("crs", "OGC:CRS84")
+        df[column] = gpd.GeoSeries.from_wkb(table[column].to_numpy(zero_copy_only=False), crs=crs, index=df.index)
+    # Keep the original column order (a stored pandas index is not a column)
+    df = df[[c for c in table.column_names if c in df.columns]]
+    primary = geo.get("primary_column", "geometry")
+    if primary not in df.columns:
+        return df
+    return gpd.GeoDataFrame(df, geometry=primary)
+
+def read_hex_table(parquet_path, columns=None):
+    """Drop-in for gpd.read_parquet that goes through the Arrow IPC cache
+
+    Pass columns= without geometry columns when the geometry is not needed;
+    that is the fast, shared-memory path.
+    """
+    if os.environ.get(CACHE_ENV) == "0":
+        _, geometry_columns = _geometry_columns(pq.read_schema(parquet_path))
+        wants_geometry = columns is None or any(c in geometry_columns for c in columns)
+        return pipeline_metrics.read_parquet(parquet_path, geo=wants_geometry, columns=columns)
+    with stage("read_hex_table", path=str(parquet_path), columns=columns) as metrics:
+        gdf = _to_frame(open_cached_table(parquet_path, columns))
+        metrics.rows = len(gdf)
+    return gdf
@@ -0,0 +1,176 @@
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import geopandas as gpd
+import pandas as pd
+
+# Set HEX_METRICS=1 to print one JSON record per stage, or HEX_METRICS=<file.jsonl>
+# to append the records to a file instead.
+METRICS_ENV = "HEX_METRICS"
+# Set HEX_PROFILE=<dir> to dump a cProfile .prof file and a tracemalloc report
+# for every entry point started through run_profiled(). Traced per-stage peaks
+# (peak_traced_mb) are only measured while this is on.
+PROFILE_ENV = "HEX_PROFILE"
+MAX_RECORDS = 10_000
+
+# The most recent records emitted in this process, for callers that want to
+# inspect the metrics without parsing the output
+records = deque(maxlen=MAX_RECORDS)
+
+# [traced bytes at entry, running traced peak] of each open stage, innermost last
+_peak_stack = []
+
+def _current_rss_mb():
+    """Current resident set size of the process in MB, or None if unavailable"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        # Not Linux; there is no stdlib way to read current RSS elsewhere
+        return None
+    return round(resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2, 1)
+
+def _fold_traced_peak():
+    """Fold the traced peak since the last reset into every open stage, then reset"""
+    peak = tracemalloc.get_traced_memory()[1]
+    for frame in _peak_stack:
+        frame[1] = max(frame[1], peak)
+    tracemalloc.reset_peak()
+
+def emit(record):
+    """Record a metrics dict and write it to the HEX_METRICS target if set"""
+    records.append(record)
+    target = os.environ.get(METRICS_ENV)
+    if not target:
+        return
+    line = json.dumps(record, default=str)
+    if target in ("1", "stdout"):
+        print(line)
+    else:
+        with open(target, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+class StageMetrics:
+    """Mutable metrics for one stage; set rows/bytes_read/extra fields inside the block"""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.rows = None
+        self.bytes_read = None
+        self.fields = dict(fields)
+
+    def to_record(self, seconds, status, rss_start_mb, rss_end_mb, peak_traced_mb):
+        rss_delta_mb = None
+        if rss_start_mb is not None and rss_end_mb is not None:
+            rss_delta_mb = round(rss_end_mb - rss_start_mb, 1)
+        record = {
+            "stage": self.name,
+            "status": status,
+            "seconds": round(seconds, 4),
+            "rows": self.rows,
+            "bytes_read": self.bytes_read,
+            "rss_start_mb": rss_start_mb,
+            "rss_end_mb": rss_end_mb,
+            "rss_delta_mb": rss_delta_mb,
+            "peak_traced_mb": peak_traced_mb,
+        }
+        record.update(self.fields)
+        return record
+
+@contextmanager
+def stage(name, **fields):
+    """Time a block of work and emit a metrics record when it finishes"""
+    metrics = StageMetrics(name, **fields)
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        # Credit allocations so far to the enclosing stages before this one
+        # starts its own peak; nested stages fold their peak back on exit
+        _fold_traced_peak()
+        current = tracemalloc.get_traced_memory()[0]
+        _peak_stack.append([current, current])
+    rss_start_mb = _current_rss_mb()
+    status = "ok"
+    start = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        peak_traced_mb = None
+        if tracing and tracemalloc.is_tracing():
+            _fold_traced_peak()
+            entry, peak = _peak_stack.pop()
+            # Peak allocated on top of what was live when the stage started
+            peak_traced_mb = round((peak - entry) / 1024 ** 2, 1)
+        elif tracing:
+            _peak_stack.pop()
+        emit(metrics.to_record(seconds, status, rss_start_mb, _current_rss_mb(), peak_traced_mb))
+
+def instrumented(name):
+    """Decorator that runs a loader/aggregation function inside a stage"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name, function=func.__name__) as metrics:
+                result = func(*args, **kwargs)
+                # Only count rows for frame-like results, not summary dicts
+                if hasattr(result, "shape"):
+                    metrics.rows = len(result)
+                return result
+        return wrapper
+    return decorator
+
+def read_parquet(path, geo=True, **kwargs):
+    """gpd.read_parquet (or pd.read_parquet if geo=False) with a metrics record for rows and bytes read"""
+    with stage("read_parquet", path=str(path), columns=kwargs.get("columns")) as metrics:
+        metrics.bytes_read = os.path.getsize(path)
+        if geo:
+            gdf = gpd.read_parquet(path, **kwargs)
+        else:
+            gdf = pd.read_parquet(path, **kwargs)
+        metrics.rows = len(gdf)
+    return gdf
+
+def run_profiled(func, *args, **kwargs):
+    """Run an entry point, profiling it with cProfile and tracemalloc if HEX_PROFILE is set"""
+    profile_dir = os.environ.get(PROFILE_ENV)
+    if not profile_dir:
+        return func(*args, **kwargs)
+
+    profile_dir = Path(profile_dir)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    run_name = f"{Path(sys.argv[0]).stem}_{func.__name__}_{time.strftime('%Y%m%d_%H%M%S')}"
+
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        prof_file = profile_dir / f"{run_name}.prof"
+        profiler.dump_stats(prof_file)
+
+        stats_text = io.StringIO()
+        pstats.Stats(profiler, stream=stats_text).sort_stats("cumulative").print_stats(30)
+        alloc_lines = [str(stat) for stat in snapshot.statistics("lineno")[:30]]
+        report_file = profile_dir / f"{run_name}.txt"
+        with open(report_file, "w", encoding="utf-8") as f:
+            f.write(stats_text.getvalue())
+            f.write("\nTop allocations (tracemalloc):\n")
+            f.write("\n".join(alloc_lines) + "\n")
+
+        print(f"🔬 Profile saved to {prof_file} (summary: {report_file})")